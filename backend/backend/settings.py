@@ -37,7 +37,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'whiteboard.middleware.AsyncWhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,14 +67,38 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 ASGI_APPLICATION = "backend.asgi.application"
 
 # Database Configuration
+# PostgreSQL uses psycopg's connection pool: ASGI runs sync code on a thread
+# pool, and with persistent connections every thread kept its own. Pooled
+# connections are checked out per request and returned when it finishes.
+DB_POOL = os.environ.get("DB_POOL", "True").lower() == "true"
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+
+# Optional read replica for read-only views (see whiteboard.db_routing). Any
+# dj-database-url URL works, e.g. sqlite:////tmp/replica.sqlite3 locally.
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+# After a write, cached representations are rebuilt from the primary for this
+# many seconds so replica lag is not cached
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", "5"))
+
+def _database_config(url):
+    config = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+    if DB_POOL and config["ENGINE"] == "django.db.backends.postgresql":
+        # Pooling and persistent connections are mutually exclusive
+        config["CONN_MAX_AGE"] = 0
+        config["CONN_HEALTH_CHECKS"] = False
+        config.setdefault("OPTIONS", {})["pool"] = {
+            "min_size": DB_POOL_MIN_SIZE,
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": DB_POOL_TIMEOUT,
+        }
+    return config
+
 if DATABASE_URL:
     # Production database (PostgreSQL from Render)
     DATABASES = {
-        'default': dj_database_url.config(
-            default=DATABASE_URL,
-            conn_max_age=600,
-            conn_health_checks=True,
-        )
+        'default': _database_config(DATABASE_URL)
     }
 else:
     # Local development database (SQLite)
@@ -85,6 +109,12 @@ else:
         }
     }
 
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = _database_config(DATABASE_REPLICA_URL)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['whiteboard.db_routing.ReadReplicaRouter']
+
 # Channel layers (required by Django Channels). Use Redis in production if REDIS_URL is set,
 # otherwise fall back to the in-memory channel layer for local development.
 REDIS_URL = os.environ.get("REDIS_URL")
@@ -109,6 +139,44 @@ else:
         },
     }
 
+# Cache for API representations (profile, boards). Shared through Redis when
+# available so invalidation on write reaches every worker.
+if REDIS_URL and _is_valid_redis_url(REDIS_URL):
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
+# Realtime frame compression: frames at least this many bytes are deflated for
+# sockets that connect with ?compress=deflate; smaller frames are sent as text.
+WS_COMPRESSION_THRESHOLD = int(os.environ.get("WS_COMPRESSION_THRESHOLD", "1024"))
+WS_COMPRESSION_LEVEL = int(os.environ.get("WS_COMPRESSION_LEVEL", "6"))
+# Frames this large are compressed on a worker thread instead of the event loop
+WS_COMPRESSION_OFFLOAD_BYTES = int(os.environ.get("WS_COMPRESSION_OFFLOAD_BYTES", str(64 * 1024)))
+
+# Per-worker room state: rooms idle this long are evicted, and the least
+# recently used rooms are evicted when their estimated size exceeds the budget.
+ROOM_IDLE_SECONDS = int(os.environ.get("ROOM_IDLE_SECONDS", "600"))
+ROOM_STATE_MEMORY_BUDGET = int(os.environ.get("ROOM_STATE_MEMORY_BUDGET", str(32 * 1024 * 1024)))
+
+# Longest side, in pixels, of a board exported as PNG; larger boards are scaled down.
+BOARD_EXPORT_MAX_PNG_SIZE = int(os.environ.get("BOARD_EXPORT_MAX_PNG_SIZE", "2048"))
+
+# Whiteboard cursors are broadcast as one combined frame per room at this
+# interval (seconds); frames from the same worker older than CURSOR_MAX_AGE are
+# not written to the socket immediately (the latest map is resent shortly after).
+CURSOR_FRAME_INTERVAL = float(os.environ.get("CURSOR_FRAME_INTERVAL", "0.05"))
+CURSOR_MAX_AGE = float(os.environ.get("CURSOR_MAX_AGE", "0.25"))
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "https://reactproject-hl5c.onrender.com",
@@ -146,6 +214,24 @@ else:
 WHITENOISE_USE_FINDERS = True
 WHITENOISE_AUTOREFRESH = True
 
+# Password hashing runs on a dedicated bounded pool (see whiteboard.hashing);
+# requests beyond workers + queue get a 503 instead of piling up.
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", "64"))
+
+# Optional: a lower PBKDF2 iteration count. Existing hashes are rehashed to it
+# on the next successful login. Unset keeps Django's default hashers.
+if os.environ.get("PASSWORD_HASH_ITERATIONS"):
+    PASSWORD_HASH_ITERATIONS = int(os.environ["PASSWORD_HASH_ITERATIONS"])
+    PASSWORD_HASHERS = [
+        "whiteboard.hashers.TunedPBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+        "django.contrib.auth.hashers.Argon2PasswordHasher",
+        "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+        "django.contrib.auth.hashers.ScryptPasswordHasher",
+    ]
+
 # Other settings
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
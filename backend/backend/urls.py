@@ -9,13 +9,14 @@ from django.conf.urls.static import static
 from whiteboard.views import (
     api_login, api_register, google_login, api_logout, 
     get_profile, update_profile, create_board, join_board, 
-    get_active_boards, api_test
+    get_active_boards, export_board, import_board, realtime_metrics, api_test
 )
 
 urlpatterns = [
     path('admin/', admin.site.urls),
 # API endpoints FIRST - before any catch-all
     path('api/test/', api_test, name='api_test'),
+    path('api/metrics/', realtime_metrics, name='realtime_metrics'),
     path('api/login/', api_login, name='api_login'),
     path('api/register/', api_register, name='api_register'),
     path('api/google-login/', google_login, name='google_login'),
@@ -25,6 +26,8 @@ urlpatterns = [
     path('api/board/create/', create_board, name='create_board'),
     path('api/board/join/', join_board, name='join_board'),
     path('api/boards/', get_active_boards, name='get_active_boards'),
+    path('api/board/<str:room_code>/export/', export_board, name='export_board'),
+    path('api/board/<str:room_code>/import/', import_board, name='import_board'),
     
     # Serve React app only for root path
     path('', TemplateView.as_view(template_name='index.html'), name='home'),
@@ -0,0 +1,116 @@
+"""
+Cached JSON representations with ETag/Last-Modified validators.
+
+Read-mostly endpoints store their serialized body in the cache together with
+an ETag (hash of the body) and the time it was built. Requests carrying
+If-None-Match / If-Modified-Since get a 304 without touching the database;
+everything else is served from the cached body until a write invalidates it.
+
+Entries are stored under a versioned key. A write bumps the key's generation
+instead of deleting the entry, so a rebuild that read the row before the
+write committed can only store its stale body under the old generation,
+which nothing reads any more.
+
+When a read replica is configured, the first rebuild after an invalidation is
+read from the primary for REPLICA_PIN_SECONDS, so replica lag cannot put the
+pre-write data back into the cache.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .db_routing import primary, replica_configured
+
+# Safety net only; writes invalidate these keys explicitly
+CACHE_TIMEOUT = 60 * 60
+
+ACTIVE_BOARDS_KEY = "boards:active"
+
+
+def profile_key(user_id):
+    return f"profile:{user_id}"
+
+
+def board_key(room_code):
+    return f"board:{room_code}"
+
+
+def _pin_key(key):
+    return f"{key}:pinned"
+
+
+def _gen_key(key):
+    return f"{key}:gen"
+
+
+def _generation(key):
+    gen = cache.get(_gen_key(key))
+    if gen is None:
+        # Seed from the clock rather than 0: if the generation is ever culled,
+        # a fresh one must not line up with an entry stored before it
+        cache.add(_gen_key(key), time.time_ns(), None)
+        gen = cache.get(_gen_key(key))
+    return gen
+
+
+def get_representation(key, build):
+    """
+    Return the cached ``{"body", "etag", "last_modified"}`` entry for ``key``.
+
+    On a miss ``build()`` is called for the JSON-serializable data; if it
+    returns None nothing is cached and None is returned.
+    """
+    versioned_key = f"{key}:v{_generation(key)}"
+    entry = cache.get(versioned_key)
+    if entry is not None:
+        return entry
+    if replica_configured() and cache.get(_pin_key(key)):
+        with primary():
+            data = build()
+    else:
+        data = build()
+    if data is None:
+        return None
+    body = json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+    entry = {
+        "body": body,
+        "etag": '"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest(),
+        "last_modified": int(time.time()),
+    }
+    cache.set(versioned_key, entry, CACHE_TIMEOUT)
+    return entry
+
+
+def conditional_json_response(request, entry, private=False):
+    """Serve a cached entry, answering conditional GET/HEAD requests with 304."""
+    response = None
+    if request.method in ("GET", "HEAD"):
+        response = get_conditional_response(
+            request, etag=entry["etag"], last_modified=entry["last_modified"]
+        )
+    if response is None:
+        response = HttpResponse(entry["body"], content_type="application/json")
+    response.headers["ETag"] = entry["etag"]
+    response.headers["Last-Modified"] = http_date(entry["last_modified"])
+    # Clients may keep a copy but must revalidate before reusing it
+    response.headers["Cache-Control"] = ("private, " if private else "") + "no-cache"
+    if private:
+        response.headers["Vary"] = "Cookie"
+    return response
+
+
+def invalidate(*keys):
+    for key in keys:
+        try:
+            cache.incr(_gen_key(key))
+        except ValueError:
+            cache.add(_gen_key(key), time.time_ns(), None)
+    if replica_configured():
+        cache.set_many({_pin_key(k): True for k in keys}, getattr(settings, "REPLICA_PIN_SECONDS", 5))
@@ -0,0 +1,130 @@
+"""
+Per-message compression for realtime frames.
+
+Clients opt in by connecting with ``?compress=deflate``. Frames whose JSON
+encoding is at least WS_COMPRESSION_THRESHOLD bytes are then sent as binary
+zlib data (what the browser's ``DecompressionStream('deflate')`` expects);
+smaller frames are sent as plain text so chat and presence latency is
+unaffected.
+
+A broadcast reaches every socket in a room with the same payload, so the
+compressed bytes of the most recent large frame are kept in the room's state
+(keyed by a hash of the text, and counted against the room memory budget) and
+reused by the other sockets in this worker; sockets that need a frame while
+it is still being compressed wait for that result instead of compressing it
+again. Sharing a streaming zlib context across a room is not safe (sockets
+join mid-stream and senders skip their own echoes), so each frame is
+compressed independently.
+
+Frames of WS_COMPRESSION_OFFLOAD_BYTES or more (board and code snapshots) are
+compressed on a worker thread, which zlib allows by releasing the GIL, so
+they do not stall small frames for every other socket on the event loop.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import zlib
+from urllib.parse import parse_qs
+
+from django.conf import settings
+
+from .rooms import ROOMS
+
+ALGORITHM = "deflate"
+
+_lock = threading.Lock()
+_inflight = {}   # (room, digest) -> future of a compression running off the loop
+_stats = {
+    "frames_raw": 0,
+    "frames_compressed": 0,
+    "cache_hits": 0,
+    "bytes_uncompressed": 0,
+    "bytes_compressed": 0,
+    "compress_seconds": 0.0,
+}
+
+
+def threshold():
+    return getattr(settings, "WS_COMPRESSION_THRESHOLD", 1024)
+
+
+def level():
+    return getattr(settings, "WS_COMPRESSION_LEVEL", 6)
+
+
+def offload_threshold():
+    return getattr(settings, "WS_COMPRESSION_OFFLOAD_BYTES", 64 * 1024)
+
+
+def client_accepts_compression(scope):
+    """True if the socket asked for compressed frames in its query string."""
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return ALGORITHM in query.get("compress", [])
+
+
+def _deflate(raw):
+    started = time.perf_counter()
+    data = zlib.compress(raw, level())
+    elapsed = time.perf_counter() - started
+    with _lock:
+        _stats["compress_seconds"] += elapsed
+    return data
+
+
+async def _compress_for_room(room, raw):
+    # Room state is only touched here on the event loop, never from the executor
+    digest = hashlib.blake2b(raw, digest_size=16).digest()
+    cached = ROOMS.cached_frame(room, digest)
+    if cached is None and (room, digest) in _inflight:
+        cached = await asyncio.shield(_inflight[(room, digest)])
+    if cached is not None:
+        with _lock:
+            _stats["cache_hits"] += 1
+        return cached
+
+    if len(raw) < offload_threshold():
+        data = _deflate(raw)
+    else:
+        future = asyncio.get_running_loop().run_in_executor(None, _deflate, raw)
+        _inflight[(room, digest)] = future
+        try:
+            # Shielded so a socket closing mid-compression does not cancel it
+            # for the others waiting on the same frame
+            data = await asyncio.shield(future)
+        finally:
+            _inflight.pop((room, digest), None)
+
+    ROOMS.cache_frame(room, digest, data)
+    return data
+
+
+async def encode_frame(room, text, compress):
+    """
+    Return ``(text_data, bytes_data)`` for a serialized frame; exactly one is set.
+    """
+    raw = text.encode("utf-8") if compress else None
+    if raw is None or len(raw) < threshold():
+        with _lock:
+            _stats["frames_raw"] += 1
+        return text, None
+
+    data = await _compress_for_room(room, raw)
+    with _lock:
+        _stats["frames_compressed"] += 1
+        _stats["bytes_uncompressed"] += len(raw)
+        _stats["bytes_compressed"] += len(data)
+    return None, data
+
+
+def compression_stats():
+    """Snapshot of compression counters for the metrics endpoint."""
+    with _lock:
+        stats = dict(_stats)
+    raw = stats["bytes_uncompressed"]
+    stats["ratio"] = round(stats["bytes_compressed"] / raw, 4) if raw else None
+    compressed_frames = stats["frames_compressed"] - stats["cache_hits"]
+    stats["avg_compress_ms"] = round(stats["compress_seconds"] * 1000 / compressed_frames, 4) if compressed_frames else None
+    stats["threshold"] = threshold()
+    stats["offload_threshold"] = offload_threshold()
+    return stats
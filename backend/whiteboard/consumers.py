@@ -1,20 +1,59 @@
+import asyncio
 import json
 import logging
-from collections import defaultdict
+import math
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from .compression import client_accepts_compression, encode_frame
+from .cursors import CursorView, frame_interval, is_stale, remove_cursor, update_cursor
+from .export import BoardImportError, build_object
+from .models import Board, BoardObject
+from .rooms import ROOMS
+
 logger = logging.getLogger("whiteboard.consumers")
 
-# In-memory presence (dev only)
-ROOM_USERS = defaultdict(set)   # room_group_name -> set(usernames)
-CHANNEL_USER = {}               # channel_name -> (room_group_name, username)
 
+@database_sync_to_async
+def persist_object(room_name, data):
+    """Store a completed drawing object so the board can be exported later."""
+    board = Board.objects.filter(room_code=room_name.upper(), is_active=True).first()
+    if board is None:
+        return
+    try:
+        obj = build_object(board, data)
+    except BoardImportError as e:
+        # Still broadcast live, but never store what the exporters cannot render
+        logger.warning("persist_object: room=%s rejected object: %s", room_name, e)
+        return
+    obj.save()
+
+
+@database_sync_to_async
+def clear_objects(room_name):
+    BoardObject.objects.filter(board__room_code=room_name.upper()).delete()
+
+
+class FrameSenderMixin:
+    """Sends JSON frames, compressing large ones for sockets that opted in."""
 
-class WhiteboardConsumer(AsyncWebsocketConsumer):
+    async def send_frame(self, payload):
+        text, data = await encode_frame(self.room_group_name, json.dumps(payload), getattr(self, "compress", False))
+        if data is not None:
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=text)
+
+
+class WhiteboardConsumer(FrameSenderMixin, AsyncWebsocketConsumer):
     async def connect(self):
         try:
             self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
             self.room_group_name = f"room_{self.room_name}"
+            self.compress = client_accepts_compression(self.scope)
+            self.cursor_view = CursorView()
+            self.cursor_resend = None
+            ROOMS.room(self.room_group_name)
 
             logger.info("connect: channel=%s room=%s scope_path=%s", self.channel_name, self.room_group_name, self.scope.get("path"))
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
@@ -25,12 +64,15 @@ class WhiteboardConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         try:
-            info = CHANNEL_USER.pop(self.channel_name, None)
+            if getattr(self, "cursor_resend", None):
+                self.cursor_resend.cancel()
+            # In-memory presence is per worker (dev only), see rooms.RoomRegistry
+            info = ROOMS.leave(self.channel_name)
             if info:
-                room, username = info
-                ROOM_USERS[room].discard(username)
+                room, username, users = info
+                remove_cursor(self.channel_layer, room, username)
                 await self.channel_layer.group_send(room, {"type": "user_left", "username": username, "sender_channel": self.channel_name})
-                await self.channel_layer.group_send(room, {"type": "user_list", "users": list(ROOM_USERS[room]), "sender_channel": self.channel_name})
+                await self.channel_layer.group_send(room, {"type": "user_list", "users": users, "sender_channel": self.channel_name})
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
             logger.info("disconnect: channel=%s code=%s", self.channel_name, close_code)
         except Exception as e:
@@ -39,19 +81,34 @@ class WhiteboardConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         try:
             data = json.loads(text_data)
+            ROOMS.room(self.room_group_name)
             logger.debug("[receive] channel=%s data=%s", self.channel_name, data)
             message_type = data.get("type")
 
-            if message_type == "join":
+            if message_type == "cursor":
+                # Latest-value-wins: only the room state is updated here, the
+                # periodic cursor frame does the broadcasting
+                username = ROOMS.username(self.channel_name)
+                try:
+                    x, y = float(data["x"]), float(data["y"])
+                except (KeyError, TypeError, ValueError):
+                    return
+                # float() accepts "nan"/"inf", which would make every later
+                # frame for the room invalid JSON for browsers
+                if not (math.isfinite(x) and math.isfinite(y)):
+                    return
+                if username:
+                    update_cursor(self.channel_layer, self.room_group_name, username, x, y)
+
+            elif message_type == "join":
                 username = data.get("username") or f"User_{self.channel_name[-6:]}"
 
                 # update mapping
-                CHANNEL_USER[self.channel_name] = (self.room_group_name, username)
-                ROOM_USERS[self.room_group_name].add(username)
+                users = ROOMS.join(self.room_group_name, self.channel_name, username)
 
                 # broadcast join + authoritative list
                 await self.channel_layer.group_send(self.room_group_name, {"type": "user_joined", "username": username, "sender_channel": self.channel_name})
-                await self.channel_layer.group_send(self.room_group_name, {"type": "user_list", "users": list(ROOM_USERS[self.room_group_name]), "sender_channel": self.channel_name})
+                await self.channel_layer.group_send(self.room_group_name, {"type": "user_list", "users": users, "sender_channel": self.channel_name})
 
             elif message_type == "chat":
                 await self.channel_layer.group_send(self.room_group_name, {"type": "chat_message", "message": data.get("message"), "sender_channel": self.channel_name})
@@ -61,9 +118,12 @@ class WhiteboardConsumer(AsyncWebsocketConsumer):
 
             elif message_type == "draw_complete":
                 await self.channel_layer.group_send(self.room_group_name, {"type": "object_added", "object_data": data, "sender_channel": self.channel_name})
+                if isinstance(data.get("object"), dict):
+                    await persist_object(self.room_name, data["object"])
 
             elif message_type == "clear_canvas":
                 await self.channel_layer.group_send(self.room_group_name, {"type": "canvas_cleared", "sender_channel": self.channel_name})
+                await clear_objects(self.room_name)
 
             else:
                 # Unknown message type -- ignore or log
@@ -79,35 +139,60 @@ class WhiteboardConsumer(AsyncWebsocketConsumer):
     # Event handlers sent by group_send
     async def user_joined(self, event):
         if event.get("sender_channel") != self.channel_name:
-            await self.send(text_data=json.dumps({"type": "user_joined", "username": event["username"]}))
+            await self.send_frame({"type": "user_joined", "username": event["username"]})
 
     async def user_left(self, event):
         if event.get("sender_channel") != self.channel_name:
-            await self.send(text_data=json.dumps({"type": "user_left", "username": event.get("username")}))
+            await self.send_frame({"type": "user_left", "username": event.get("username")})
 
     async def user_list(self, event):
-        await self.send(text_data=json.dumps({"type": "user_list", "users": event.get("users", [])}))
+        await self.send_frame({"type": "user_list", "users": event.get("users", [])})
 
     async def drawing_update(self, event):
         # Send live stroke to all clients (including sender) so clients that expect server-echo get the update
-        await self.send(text_data=json.dumps({"type": "live_stroke", "stroke": event["stroke_data"]}))
+        await self.send_frame({"type": "live_stroke", "stroke": event["stroke_data"]})
 
     async def object_added(self, event):
-        await self.send(text_data=json.dumps({"type": "object_added", "object": event["object_data"]}))
+        await self.send_frame({"type": "object_added", "object": event["object_data"]})
 
     async def chat_message(self, event):
         # Send chat message to all clients (including sender) so clients that expect server-echo get the update
-        await self.send(text_data=json.dumps({"type": "chat", "message": event["message"]}))
+        await self.send_frame({"type": "chat", "message": event["message"]})
 
     async def canvas_cleared(self, event):
-        await self.send(text_data=json.dumps({"type": "canvas_cleared"}))
-
-
-class IDEConsumer(AsyncWebsocketConsumer):
+        await self.send_frame({"type": "canvas_cleared"})
+
+    async def cursor_frame(self, event):
+        if not self.cursor_view.apply(event):
+            return
+        if is_stale(event):
+            # The socket is behind: skip this write, but make sure the latest
+            # map still goes out if no fresher frame arrives
+            if self.cursor_resend is None:
+                self.cursor_resend = asyncio.get_running_loop().create_task(self._resend_cursors())
+            return
+        await self._send_cursors()
+
+    async def _resend_cursors(self):
+        await asyncio.sleep(frame_interval())
+        self.cursor_resend = None
+        await self._send_cursors()
+
+    async def _send_cursors(self):
+        if self.cursor_resend is not None:
+            self.cursor_resend.cancel()
+            self.cursor_resend = None
+        # The full map for the room; clients replace theirs with it
+        await self.send_frame({"type": "cursors", "cursors": self.cursor_view.cursors()})
+
+
+class IDEConsumer(FrameSenderMixin, AsyncWebsocketConsumer):
     async def connect(self):
         try:
             self.ide_id = self.scope["url_route"]["kwargs"].get("ide_id")
             self.room_group_name = f"ide_{self.ide_id}"
+            self.compress = client_accepts_compression(self.scope)
+            ROOMS.room(self.room_group_name)
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
             await self.accept()
         except Exception as e:
@@ -116,12 +201,12 @@ class IDEConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         try:
-            info = CHANNEL_USER.pop(self.channel_name, None)
+            # In-memory presence is per worker (dev only), see rooms.RoomRegistry
+            info = ROOMS.leave(self.channel_name)
             if info:
-                room, username = info
-                ROOM_USERS[room].discard(username)
+                room, username, users = info
                 await self.channel_layer.group_send(room, {"type": "user_left", "username": username, "sender_channel": self.channel_name})
-                await self.channel_layer.group_send(room, {"type": "user_list", "users": list(ROOM_USERS[room]), "sender_channel": self.channel_name})
+                await self.channel_layer.group_send(room, {"type": "user_list", "users": users, "sender_channel": self.channel_name})
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
         except Exception as e:
             logger.exception("IDE disconnect error: %s", e)
@@ -129,13 +214,13 @@ class IDEConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         try:
             data = json.loads(text_data)
+            ROOMS.room(self.room_group_name)
             t = data.get("type")
             if t == "join":
                 username = data.get("username") or f"User_{self.channel_name[-4:]}"
-                CHANNEL_USER[self.channel_name] = (self.room_group_name, username)
-                ROOM_USERS[self.room_group_name].add(username)
+                users = ROOMS.join(self.room_group_name, self.channel_name, username)
                 await self.channel_layer.group_send(self.room_group_name, {"type": "user_joined", "username": username, "sender_channel": self.channel_name})
-                await self.channel_layer.group_send(self.room_group_name, {"type": "user_list", "users": list(ROOM_USERS[self.room_group_name]), "sender_channel": self.channel_name})
+                await self.channel_layer.group_send(self.room_group_name, {"type": "user_list", "users": users, "sender_channel": self.channel_name})
             elif t in ("code_update", "file_change", "output", "run_complete"):
                 await self.channel_layer.group_send(self.room_group_name, {"type": t, "payload": data, "sender_channel": self.channel_name})
         except Exception as e:
@@ -143,33 +228,35 @@ class IDEConsumer(AsyncWebsocketConsumer):
 
     async def user_joined(self, event):
         if event.get("sender_channel") != self.channel_name:
-            await self.send(text_data=json.dumps({"type": "user_joined", "username": event["username"]}))
+            await self.send_frame({"type": "user_joined", "username": event["username"]})
 
     async def user_left(self, event):
         if event.get("sender_channel") != self.channel_name:
-            await self.send(text_data=json.dumps({"type": "user_left", "username": event.get("username")}))
+            await self.send_frame({"type": "user_left", "username": event.get("username")})
 
     async def user_list(self, event):
-        await self.send(text_data=json.dumps({"type": "user_list", "users": event.get("users", [])}))
+        await self.send_frame({"type": "user_list", "users": event.get("users", [])})
 
     async def code_update(self, event):
-        await self.send(text_data=json.dumps({"type": "code_update", "code": event["payload"].get("code"), "file": event["payload"].get("file")}))
+        await self.send_frame({"type": "code_update", "code": event["payload"].get("code"), "file": event["payload"].get("file")})
 
     async def file_change(self, event):
-        await self.send(text_data=json.dumps({"type": "file_change", "file": event["payload"].get("file"), "code": event["payload"].get("code")}))
+        await self.send_frame({"type": "file_change", "file": event["payload"].get("file"), "code": event["payload"].get("code")})
 
     async def output(self, event):
-        await self.send(text_data=json.dumps({"type": "output", "output": event["payload"].get("output")}))
+        await self.send_frame({"type": "output", "output": event["payload"].get("output")})
 
     async def run_complete(self, event):
-        await self.send(text_data=json.dumps({"type": "run_complete"}))
+        await self.send_frame({"type": "run_complete"})
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(FrameSenderMixin, AsyncWebsocketConsumer):
     async def connect(self):
         try:
             self.chat_id = self.scope["url_route"]["kwargs"].get("chat_id")
             self.room_group_name = f"chat_{self.chat_id}"
+            self.compress = client_accepts_compression(self.scope)
+            ROOMS.room(self.room_group_name)
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
             await self.accept()
         except Exception as e:
@@ -178,12 +265,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         try:
-            info = CHANNEL_USER.pop(self.channel_name, None)
+            # In-memory presence is per worker (dev only), see rooms.RoomRegistry
+            info = ROOMS.leave(self.channel_name)
             if info:
-                room, username = info
-                ROOM_USERS[room].discard(username)
+                room, username, users = info
                 await self.channel_layer.group_send(room, {"type": "user_left", "username": username, "sender_channel": self.channel_name})
-                await self.channel_layer.group_send(room, {"type": "user_list", "users": list(ROOM_USERS[room]), "sender_channel": self.channel_name})
+                await self.channel_layer.group_send(room, {"type": "user_list", "users": users, "sender_channel": self.channel_name})
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
         except Exception as e:
             logger.exception("Chat disconnect error: %s", e)
@@ -191,13 +278,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         try:
             data = json.loads(text_data)
+            ROOMS.room(self.room_group_name)
             t = data.get("type")
             if t == "join":
                 username = data.get("username") or f"User_{self.channel_name[-4:]}"
-                CHANNEL_USER[self.channel_name] = (self.room_group_name, username)
-                ROOM_USERS[self.room_group_name].add(username)
+                users = ROOMS.join(self.room_group_name, self.channel_name, username)
                 await self.channel_layer.group_send(self.room_group_name, {"type": "user_joined", "username": username, "sender_channel": self.channel_name})
-                await self.channel_layer.group_send(self.room_group_name, {"type": "user_list", "users": list(ROOM_USERS[self.room_group_name]), "sender_channel": self.channel_name})
+                await self.channel_layer.group_send(self.room_group_name, {"type": "user_list", "users": users, "sender_channel": self.channel_name})
             elif t == "chat":
                 await self.channel_layer.group_send(self.room_group_name, {"type": "chat_message", "message": data.get("message"), "sender_channel": self.channel_name})
         except Exception as e:
@@ -205,15 +292,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def user_joined(self, event):
         if event.get("sender_channel") != self.channel_name:
-            await self.send(text_data=json.dumps({"type": "user_joined", "username": event["username"]}))
+            await self.send_frame({"type": "user_joined", "username": event["username"]})
 
     async def user_left(self, event):
         if event.get("sender_channel") != self.channel_name:
-            await self.send(text_data=json.dumps({"type": "user_left", "username": event.get("username")}))
+            await self.send_frame({"type": "user_left", "username": event.get("username")})
 
     async def user_list(self, event):
-        await self.send(text_data=json.dumps({"type": "user_list", "users": event.get("users", [])}))
+        await self.send_frame({"type": "user_list", "users": event.get("users", [])})
 
     async def chat_message(self, event):
         # Send chat message to all clients (including sender) so clients that expect server-echo get the update
-        await self.send(text_data=json.dumps({"type": "chat", "message": event["message"]}))
\ No newline at end of file
+        await self.send_frame({"type": "chat", "message": event["message"]})
\ No newline at end of file
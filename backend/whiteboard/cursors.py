@@ -0,0 +1,151 @@
+"""
+Lossy, rate-limited cursor presence for whiteboard rooms.
+
+Incoming ``cursor`` messages only overwrite the sender's latest position in
+the room state; nothing is queued per movement. A per-room flush task in each
+worker broadcasts one ``cursor_frame`` every CURSOR_FRAME_INTERVAL seconds
+in which something changed, and stops itself once the room has been quiet for
+a while.
+
+Each frame carries the worker's full cursor map for the room, so any frame
+supersedes every earlier one and a lost frame is repaired by the next.
+Frames are tagged with the sending worker and a sequence number; every socket
+keeps the latest map per worker (CursorView) and the client replaces its
+cursors with their union. A frame from this worker that sat in the queue
+longer than CURSOR_MAX_AGE is not written to the socket straight away, so a
+slow socket skips stale positions instead of working through a backlog ahead
+of strokes and chat. Ages are only compared for frames from this worker:
+monotonic clocks of different processes cannot be compared.
+"""
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+
+from django.conf import settings
+
+from .rooms import ROOMS
+
+logger = logging.getLogger("whiteboard.cursors")
+
+# Quiet ticks after which a room's flush task exits
+IDLE_TICKS = 40
+
+WORKER_ID = uuid.uuid4().hex
+# One counter for all rooms: still strictly increasing within each room, and
+# unaffected by a room being evicted and rehydrated
+_seq = itertools.count(1)
+
+_tasks = {}   # room_group_name -> asyncio.Task
+_stats = {
+    "updates": 0,
+    "unchanged": 0,
+    "frames_sent": 0,
+    "frames_dropped_stale": 0,
+    "frames_out_of_order": 0,
+}
+
+
+def frame_interval():
+    return getattr(settings, "CURSOR_FRAME_INTERVAL", 0.05)
+
+
+def max_age():
+    return getattr(settings, "CURSOR_MAX_AGE", 0.25)
+
+
+def update_cursor(channel_layer, room, username, x, y):
+    """Record a cursor position and make sure the room's flush task is running."""
+    _stats["updates"] += 1
+    if not ROOMS.set_cursor(room, username, (x, y)):
+        _stats["unchanged"] += 1
+        return
+    _ensure_flusher(channel_layer, room)
+
+
+def remove_cursor(channel_layer, room, username):
+    if ROOMS.drop_cursor(room, username):
+        _ensure_flusher(channel_layer, room)
+
+
+def _ensure_flusher(channel_layer, room):
+    if room not in _tasks:
+        _tasks[room] = asyncio.get_running_loop().create_task(_flush_loop(channel_layer, room))
+
+
+def _take_frame(state):
+    dirty = set(state.dirty_cursors)
+    state.dirty_cursors.clear()
+    return {username: {"x": x, "y": y} for username, (x, y) in state.cursors.items()}, dirty
+
+
+async def _flush_loop(channel_layer, room):
+    quiet = 0
+    try:
+        while quiet < IDLE_TICKS:
+            await asyncio.sleep(frame_interval())
+            state = ROOMS.peek(room)
+            if state is None or not state.dirty_cursors:
+                quiet += 1
+                continue
+            quiet = 0
+            frame, dirty = _take_frame(state)
+            event = {
+                "type": "cursor_frame",
+                "origin": WORKER_ID,
+                "seq": next(_seq),
+                "cursors": frame,
+                "sent_at": time.monotonic(),
+            }
+            try:
+                await channel_layer.group_send(room, event)
+            except Exception as e:
+                # Mark the room dirty again so the next tick resends the full map
+                logger.warning("cursor frame dropped: room=%s error=%s", room, e)
+                state = ROOMS.peek(room)
+                if state is not None:
+                    state.dirty_cursors.update(dirty)
+                continue
+            _stats["frames_sent"] += 1
+    finally:
+        # No await between the last dirty check and here, so no update can slip in unseen
+        _tasks.pop(room, None)
+
+
+class CursorView:
+    """One socket's view of a room's cursors, merged from every worker's frames."""
+
+    def __init__(self):
+        self._sources = {}   # origin worker -> (seq, cursors)
+
+    def apply(self, event):
+        """Take a frame's map; returns False if a newer frame from its worker was already seen."""
+        origin, seq = event["origin"], event["seq"]
+        last = self._sources.get(origin)
+        if last is not None and seq <= last[0]:
+            _stats["frames_out_of_order"] += 1
+            return False
+        self._sources[origin] = (seq, event["cursors"])
+        return True
+
+    def cursors(self):
+        merged = {}
+        for _, cursors in self._sources.values():
+            merged.update(cursors)
+        return merged
+
+
+def is_stale(event):
+    """True for a frame from this worker that waited longer than CURSOR_MAX_AGE."""
+    if event["origin"] == WORKER_ID and time.monotonic() - event["sent_at"] > max_age():
+        _stats["frames_dropped_stale"] += 1
+        return True
+    return False
+
+
+def cursor_stats():
+    stats = dict(_stats)
+    stats["active_rooms"] = len(_tasks)
+    stats["frame_interval"] = frame_interval()
+    return stats
@@ -0,0 +1,339 @@
+"""
+Streaming export and import of board contents.
+
+Exports are produced by generators that walk the board's objects in
+keyset-paginated batches, so memory stays flat no matter how many objects a
+board holds, and the database connection is given back between batches
+rather than held for the whole (possibly slow) download. Imports read a newline-delimited JSON op stream line by line and
+bulk-insert objects in batches.
+"""
+import json
+import math
+import tempfile
+from xml.sax.saxutils import quoteattr
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.http import StreamingHttpResponse
+
+from .models import BoardObject
+
+# Rows fetched per batch while iterating a board's objects
+ITER_CHUNK_SIZE = 2000
+# Objects inserted per bulk_create during import
+IMPORT_BATCH_SIZE = 1000
+# Bytes buffered before a chunk is handed to the response
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Matches the whiteboard canvas background in the frontend; eraser strokes are
+# painted with it in SVG exports since SVG has no destination-out compositing.
+SVG_BACKGROUND = "#1a1a2e"
+DEFAULT_COLOR = "#ff00cc"
+DEFAULT_LINE_WIDTH = 3
+PADDING = 10
+
+
+# Longest colour string accepted from clients (CSS names, hex, rgba(...))
+MAX_COLOR_LENGTH = 64
+
+
+class BoardImportError(ValueError):
+    """Raised when an import stream or a drawing object is malformed."""
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def validate_object(data):
+    """
+    Check a client-supplied drawing object before it is stored.
+
+    Objects arrive from websocket clients and imports, and are rendered much
+    later by the exporters, so anything they cannot draw is rejected here.
+    """
+    if not isinstance(data, dict):
+        raise BoardImportError("object must be a JSON object")
+    points = data.get("points")
+    if not isinstance(points, list) or not points:
+        raise BoardImportError("points must be a non-empty list of {x, y}")
+    for point in points:
+        if not isinstance(point, dict) or not _is_number(point.get("x")) or not _is_number(point.get("y")):
+            raise BoardImportError("points must be a non-empty list of {x, y}")
+    color = data.get("color")
+    if color is not None and (not isinstance(color, str) or len(color) > MAX_COLOR_LENGTH):
+        raise BoardImportError("color must be a string")
+    width = data.get("lineWidth")
+    if width is not None and (not _is_number(width) or width <= 0):
+        raise BoardImportError("lineWidth must be a positive number")
+
+
+def _object_points(data):
+    points = data.get("points") or []
+    return [(float(p["x"]), float(p["y"])) for p in points if "x" in p and "y" in p]
+
+
+def object_bounds(data):
+    """Return (min_x, min_y, max_x, max_y) for a drawing object, padded by line width."""
+    points = _object_points(data)
+    if not points:
+        return 0.0, 0.0, 0.0, 0.0
+    half = float(data.get("lineWidth") or DEFAULT_LINE_WIDTH) / 2
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    return min(xs) - half, min(ys) - half, max(xs) + half, max(ys) + half
+
+
+def build_object(board, data):
+    """
+    Build an unsaved BoardObject for ``data`` with its bounding box filled in.
+
+    Raises BoardImportError if ``data`` fails validate_object.
+    """
+    validate_object(data)
+    min_x, min_y, max_x, max_y = object_bounds(data)
+    return BoardObject(
+        board=board,
+        kind=str(data.get("type") or "stroke")[:20],
+        data=data,
+        min_x=min_x,
+        min_y=min_y,
+        max_x=max_x,
+        max_y=max_y,
+    )
+
+
+def _release_connection(alias):
+    # With the psycopg pool this returns the connection to the pool; inside a
+    # transaction (tests, ATOMIC_REQUESTS) the connection has to stay open
+    connection = connections[alias]
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def _iter_objects(board):
+    """Yield the data of the board's objects in id order, one batch per query."""
+    last_id = 0
+    while True:
+        batch = (
+            BoardObject.objects.filter(board=board, id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "data")[:ITER_CHUNK_SIZE]
+        )
+        rows = list(batch)
+        _release_connection(batch.db)
+        for last_id, data in rows:
+            yield data
+        if len(rows) < ITER_CHUNK_SIZE:
+            return
+
+
+def _board_bounds(board):
+    agg = BoardObject.objects.filter(board=board).aggregate(
+        min_x=Min("min_x"), min_y=Min("min_y"), max_x=Max("max_x"), max_y=Max("max_y")
+    )
+    if agg["min_x"] is None:
+        return 0.0, 0.0, 1.0, 1.0
+    return agg["min_x"], agg["min_y"], max(agg["max_x"], agg["min_x"] + 1), max(agg["max_y"], agg["min_y"] + 1)
+
+
+def _buffered(parts):
+    """Coalesce many small string/bytes parts into chunks of ~STREAM_CHUNK_BYTES."""
+    buf = []
+    size = 0
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        buf.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_BYTES:
+            yield b"".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield b"".join(buf)
+
+
+# --- JSON op stream ---------------------------------------------------------
+
+def _json_parts(board):
+    yield json.dumps({"op": "board", "name": board.name, "room_code": board.room_code}) + "\n"
+    for data in _iter_objects(board):
+        yield json.dumps({"op": "add", "object": data}) + "\n"
+
+
+def iter_json(board):
+    return _buffered(_json_parts(board))
+
+
+# --- SVG --------------------------------------------------------------------
+
+def _svg_element(data):
+    points = _object_points(data)
+    if not points:
+        return ""
+    width = data.get("lineWidth") or DEFAULT_LINE_WIDTH
+    color = SVG_BACKGROUND if data.get("tool") == "eraser" else (data.get("color") or DEFAULT_COLOR)
+    if len(points) == 1:
+        x, y = points[0]
+        return f'<circle cx="{x:g}" cy="{y:g}" r="{float(width) / 2:g}" fill={quoteattr(str(color))}/>\n'
+    coords = " ".join(f"{x:g},{y:g}" for x, y in points)
+    return (
+        f'<polyline points="{coords}" fill="none" stroke={quoteattr(str(color))} '
+        f'stroke-width="{float(width):g}" stroke-linecap="round" stroke-linejoin="round"/>\n'
+    )
+
+
+def _svg_parts(board):
+    min_x, min_y, max_x, max_y = _board_bounds(board)
+    x, y = min_x - PADDING, min_y - PADDING
+    w, h = max_x - min_x + 2 * PADDING, max_y - min_y + 2 * PADDING
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{w:g}" height="{h:g}" viewBox="{x:g} {y:g} {w:g} {h:g}">\n'
+        f'<rect x="{x:g}" y="{y:g}" width="{w:g}" height="{h:g}" fill="{SVG_BACKGROUND}"/>\n'
+    )
+    for data in _iter_objects(board):
+        yield _svg_element(data)
+    yield "</svg>\n"
+
+
+def iter_svg(board):
+    return _buffered(_svg_parts(board))
+
+
+# --- PNG --------------------------------------------------------------------
+
+def iter_png(board):
+    """
+    Rasterise the board and stream the encoded PNG.
+
+    The canvas is capped at BOARD_EXPORT_MAX_PNG_SIZE pixels per side, so
+    memory is bounded by the image size rather than the object count, and the
+    encoded file is spooled to disk once it outgrows a small buffer.
+    """
+    from PIL import Image, ImageDraw
+
+    max_side = getattr(settings, "BOARD_EXPORT_MAX_PNG_SIZE", 2048)
+    min_x, min_y, max_x, max_y = _board_bounds(board)
+    w, h = max_x - min_x + 2 * PADDING, max_y - min_y + 2 * PADDING
+    scale = min(1.0, max_side / max(w, h))
+    ox, oy = min_x - PADDING, min_y - PADDING
+
+    image = Image.new("RGBA", (max(1, int(w * scale)), max(1, int(h * scale))), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for data in _iter_objects(board):
+        points = [((x - ox) * scale, (y - oy) * scale) for x, y in _object_points(data)]
+        if not points:
+            continue
+        width = max(1, int(float(data.get("lineWidth") or DEFAULT_LINE_WIDTH) * scale))
+        fill = (0, 0, 0, 0) if data.get("tool") == "eraser" else (data.get("color") or DEFAULT_COLOR)
+        try:
+            if len(points) == 1:
+                px, py = points[0]
+                r = width / 2
+                draw.ellipse((px - r, py - r, px + r, py + r), fill=fill)
+            else:
+                draw.line(points, fill=fill, width=width, joint="curve")
+        except (TypeError, ValueError):
+            # Unknown colour from a client (or a row stored before validation);
+            # skip the object rather than abort the export mid-stream
+            continue
+
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    try:
+        image.save(spool, format="PNG", optimize=False)
+        image.close()
+        spool.seek(0)
+        while True:
+            chunk = spool.read(STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
+
+
+EXPORT_FORMATS = {
+    "json": (iter_json, "application/x-ndjson", "ndjson"),
+    "svg": (iter_svg, "image/svg+xml", "svg"),
+    "png": (iter_png, "image/png", "png"),
+}
+
+
+async def _aiter_sync(iterator):
+    """Drive a sync generator from async code, one chunk per thread hop."""
+    sentinel = object()
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(iterator, sentinel)
+        if chunk is sentinel:
+            break
+        yield chunk
+
+
+def streaming_response(request, iterator, content_type):
+    """
+    Wrap ``iterator`` in a StreamingHttpResponse suited to the current handler.
+
+    Django buffers sync iterators completely when serving under ASGI, so for
+    ASGI requests the generator is driven through an async iterator instead.
+    """
+    if isinstance(request, ASGIRequest):
+        iterator = _aiter_sync(iter(iterator))
+    return StreamingHttpResponse(iterator, content_type=content_type)
+
+
+# --- Import -----------------------------------------------------------------
+
+def import_ops(board, lines, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Apply a newline-delimited JSON op stream to ``board``.
+
+    Supported ops are ``add`` (append ``object``), ``clear`` (drop everything
+    imported or stored so far) and ``board`` (export header, ignored). The
+    whole import runs in one transaction; returns the number of objects added.
+    """
+    added = 0
+    batch = []
+    with transaction.atomic():
+        for lineno, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                op = json.loads(line)
+            except ValueError:
+                raise BoardImportError(f"line {lineno}: invalid JSON")
+            if not isinstance(op, dict):
+                raise BoardImportError(f"line {lineno}: op must be an object")
+
+            kind = op.get("op")
+            if kind == "add":
+                data = op.get("object")
+                if not isinstance(data, dict):
+                    raise BoardImportError(f"line {lineno}: add requires an object")
+                try:
+                    batch.append(build_object(board, data))
+                except BoardImportError as e:
+                    raise BoardImportError(f"line {lineno}: {e}")
+                if len(batch) >= batch_size:
+                    BoardObject.objects.bulk_create(batch)
+                    added += len(batch)
+                    batch = []
+            elif kind == "clear":
+                batch = []
+                added = 0
+                BoardObject.objects.filter(board=board).delete()
+            elif kind == "board":
+                continue
+            else:
+                raise BoardImportError(f"line {lineno}: unknown op {kind!r}")
+
+        if batch:
+            BoardObject.objects.bulk_create(batch)
+            added += len(batch)
+    return added
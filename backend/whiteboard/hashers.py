@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the iteration count from PASSWORD_HASH_ITERATIONS.
+
+    It keeps the ``pbkdf2_sha256`` algorithm name, so existing hashes still
+    verify and Django rehashes them to the configured count on the next
+    successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
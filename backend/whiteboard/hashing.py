@@ -0,0 +1,105 @@
+"""
+Bounded executor for password hashing.
+
+PBKDF2 costs tens of milliseconds of CPU per call. Running it on the ASGI
+default thread pool lets a login burst starve every other sync view, so the
+async auth views hand hashing work to this dedicated pool instead. At most
+PASSWORD_HASH_WORKERS calls run at once and PASSWORD_HASH_QUEUE more may wait;
+beyond that callers get HashingOverloaded and should answer 503. The worker
+count is fixed when the pool is first used; the queue limit is read on each
+call.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing pool and its queue are both full."""
+
+
+def _workers():
+    return getattr(settings, "PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+
+
+def _queue_limit():
+    return getattr(settings, "PASSWORD_HASH_QUEUE", 64)
+
+
+_executor = None
+_executor_workers = None   # size the executor was created with
+_executor_lock = threading.Lock()
+_pending = 0   # running + queued; only touched from the event loop thread
+_stats_lock = threading.Lock()
+_stats = {
+    "completed": 0,
+    "rejected": 0,
+    "wait_seconds": 0.0,
+    "run_seconds": 0.0,
+}
+
+
+def _get_executor():
+    global _executor, _executor_workers
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor_workers = _workers()
+                _executor = ThreadPoolExecutor(max_workers=_executor_workers, thread_name_prefix="password-hash")
+    return _executor
+
+
+def _pool_size():
+    # The executor cannot be resized, so admission and stats use its real size
+    _get_executor()
+    return _executor_workers
+
+
+def _call(fn, args, kwargs, submitted):
+    started = time.perf_counter()
+    # Pool threads are not request threads, so Django never recycles their
+    # connections for them; do it around each call instead
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+        finished = time.perf_counter()
+        with _stats_lock:
+            _stats["wait_seconds"] += started - submitted
+            _stats["run_seconds"] += finished - started
+
+
+async def run_hashing(fn, *args, **kwargs):
+    """Run ``fn`` (something that hashes passwords) on the bounded pool."""
+    global _pending
+    if _pending >= _pool_size() + _queue_limit():
+        _stats["rejected"] += 1
+        raise HashingOverloaded()
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(_call, fn, args, kwargs, time.perf_counter())
+        result = await loop.run_in_executor(_get_executor(), call)
+        _stats["completed"] += 1
+        return result
+    finally:
+        _pending -= 1
+
+
+def hashing_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    completed = stats["completed"]
+    stats["pending"] = _pending
+    stats["workers"] = _pool_size()
+    stats["queue_limit"] = _queue_limit()
+    stats["avg_wait_ms"] = round(stats["wait_seconds"] * 1000 / completed, 2) if completed else None
+    stats["avg_run_ms"] = round(stats["run_seconds"] * 1000 / completed, 2) if completed else None
+    return stats
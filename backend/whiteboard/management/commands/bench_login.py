@@ -0,0 +1,107 @@
+import asyncio
+import json
+import statistics
+import time
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+
+BENCH_USERNAME = "bench_login_user"
+BENCH_PASSWORD = "bench-login-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire a burst of concurrent logins at api_login and report latency, "
+        "overload responses, how long the event loop stalled meanwhile and how "
+        "slow a cheap sync endpoint (api/boards/) became during the burst."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Total login attempts")
+        parser.add_argument("--concurrency", type=int, default=50, help="Logins in flight at once")
+        parser.add_argument("--bad-password", action="store_true", help="Use a wrong password (exercises failed logins)")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        user.set_password(BENCH_PASSWORD)
+        user.save()
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                results, max_lag = asyncio.run(self._burst(options))
+        finally:
+            User.objects.filter(username=BENCH_USERNAME).delete()
+        self._report(results, max_lag, options)
+
+    async def _burst(self, options):
+        password = "wrong" if options["bad_password"] else BENCH_PASSWORD
+        body = json.dumps({"username": BENCH_USERNAME, "password": password})
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        results = []
+        self.probes = []
+        done = asyncio.Event()
+        max_lag = 0.0
+
+        async def watch_loop():
+            # Measures event-loop stalls: a blocked loop wakes this up late
+            nonlocal max_lag
+            while not done.is_set():
+                expected = time.perf_counter() + 0.01
+                await asyncio.sleep(0.01)
+                max_lag = max(max_lag, time.perf_counter() - expected)
+
+        async def probe():
+            # A cheap sync view shares the ASGI thread pool with whatever login runs on
+            client = AsyncClient()
+            while not done.is_set():
+                started = time.perf_counter()
+                async with ThreadSensitiveContext():
+                    await client.get("/api/boards/")
+                self.probes.append(time.perf_counter() - started)
+                await asyncio.sleep(0.1)
+
+        async def one():
+            async with semaphore:
+                client = AsyncClient()
+                started = time.perf_counter()
+                # ASGIHandler gives every request its own sync thread this way;
+                # AsyncClient alone would share one across the whole burst
+                async with ThreadSensitiveContext():
+                    response = await client.post("/api/login/", body, content_type="application/json")
+                results.append((response.status_code, time.perf_counter() - started))
+
+        watcher = asyncio.create_task(watch_loop())
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(options["requests"])))
+        self.elapsed = time.perf_counter() - started
+        done.set()
+        await watcher
+        await prober
+        return results, max_lag
+
+    def _report(self, results, max_lag, options):
+        latencies = sorted(latency for _, latency in results)
+        codes = {}
+        for code, _ in results:
+            codes[code] = codes.get(code, 0) + 1
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(f"requests={len(results)} concurrency={options['concurrency']} elapsed={self.elapsed:.2f}s")
+        self.stdout.write(f"throughput={len(results) / self.elapsed:.1f} req/s")
+        self.stdout.write(
+            f"latency ms: p50={pct(0.5):.1f} p95={pct(0.95):.1f} p99={pct(0.99):.1f} "
+            f"mean={statistics.mean(latencies) * 1000:.1f}"
+        )
+        self.stdout.write(f"status codes: {codes}")
+        self.stdout.write(f"max event loop stall: {max_lag * 1000:.1f} ms")
+        if self.probes:
+            self.stdout.write(
+                f"api/boards/ during burst: n={len(self.probes)} "
+                f"mean={statistics.mean(self.probes) * 1000:.1f} ms max={max(self.probes) * 1000:.1f} ms"
+            )
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-19 16:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whiteboard', '0002_board_is_active_board_room_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(default='stroke', max_length=20)),
+                ('data', models.JSONField()),
+                ('min_x', models.FloatField(default=0)),
+                ('min_y', models.FloatField(default=0)),
+                ('max_x', models.FloatField(default=0)),
+                ('max_y', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('board', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drawing_objects', to='whiteboard.board')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -33,3 +33,21 @@ class Profile(models.Model):
     
     def __str__(self):
         return f"{self.user.username}'s Profile"
+
+class BoardObject(models.Model):
+    """A completed drawing object (stroke, shape) on a board, in draw order."""
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name='drawing_objects')
+    kind = models.CharField(max_length=20, default='stroke')
+    data = models.JSONField()
+    # Bounding box, stored so exports can size the canvas with one aggregate query
+    min_x = models.FloatField(default=0)
+    min_y = models.FloatField(default=0)
+    max_x = models.FloatField(default=0)
+    max_y = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.kind} on {self.board.room_code}"
@@ -0,0 +1,205 @@
+"""
+Per-worker room state with idle eviction and a memory budget.
+
+Room state (the presence list, latest cursor positions and the last
+compressed broadcast frame) is kept in an LRU-ordered registry.
+Every connect and message touches its room; rooms with no activity for
+ROOM_IDLE_SECONDS are evicted during periodic sweeps, and the least recently
+used rooms are evicted whenever the estimated size of all resident rooms goes
+over ROOM_STATE_MEMORY_BUDGET bytes.
+
+Eviction is safe for rooms that still have sockets open: the channel -> user
+mapping is bounded by live connections and is never evicted, so the next
+access to a room rebuilds its presence list from it.
+"""
+import sys
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Rough fixed cost of a resident room: dict slot, key string, RoomState object
+ROOM_OVERHEAD_BYTES = 400
+# Tuple of two floats per cursor; the username key is already counted in users
+CURSOR_ENTRY_BYTES = 120
+
+
+class RoomState:
+    __slots__ = ("users", "cursors", "dirty_cursors", "frame_digest", "frame_data", "last_activity", "size")
+
+    def __init__(self, users=()):
+        self.users = set(users)
+        self.cursors = {}           # username -> (x, y), latest value only
+        self.dirty_cursors = set()  # usernames changed since the last cursor frame
+        self.frame_digest = None    # hash of the last large frame's text
+        self.frame_data = b""       # ...and its compressed bytes, reused by other sockets
+        self.last_activity = time.monotonic()
+        self.size = 0
+
+    def estimate_size(self):
+        return (
+            ROOM_OVERHEAD_BYTES
+            + sys.getsizeof(self.users)
+            + sum(sys.getsizeof(u) for u in self.users)
+            + sys.getsizeof(self.cursors)
+            + sys.getsizeof(self.dirty_cursors)
+            + CURSOR_ENTRY_BYTES * len(self.cursors)
+            + sys.getsizeof(self.frame_data)
+        )
+
+
+class RoomRegistry:
+    def __init__(self):
+        self._rooms = OrderedDict()    # room_group_name -> RoomState, least recently used first
+        self._channels = {}            # channel_name -> (room_group_name, username)
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+        self.created = 0
+        self.rehydrated = 0
+        self.evicted_idle = 0
+        self.evicted_budget = 0
+
+    @property
+    def idle_seconds(self):
+        return getattr(settings, "ROOM_IDLE_SECONDS", 600)
+
+    @property
+    def memory_budget(self):
+        return getattr(settings, "ROOM_STATE_MEMORY_BUDGET", 32 * 1024 * 1024)
+
+    def room(self, name):
+        """Return the state for ``name``, creating or rehydrating it, and mark it active."""
+        now = time.monotonic()
+        state = self._rooms.get(name)
+        if state is None:
+            users = {u for room, u in self._channels.values() if room == name}
+            state = RoomState(users)
+            self._rooms[name] = state
+            self._resize(state)
+            if users:
+                self.rehydrated += 1
+            else:
+                self.created += 1
+        else:
+            self._rooms.move_to_end(name)
+            state.last_activity = now
+
+        if now - self._last_sweep >= min(self.idle_seconds, 60):
+            self.sweep(now)
+        self._enforce_budget()
+        return state
+
+    def join(self, name, channel, username):
+        """Record ``username`` on ``channel`` in room ``name``; returns the room's users."""
+        state = self.room(name)
+        self._channels[channel] = (name, username)
+        state.users.add(username)
+        self._resize(state)
+        return list(state.users)
+
+    def leave(self, channel):
+        """
+        Forget ``channel``. Returns ``(room, username, users)`` or None if the
+        channel never joined.
+        """
+        info = self._channels.pop(channel, None)
+        if info is None:
+            return None
+        name, username = info
+        state = self.room(name)
+        state.users.discard(username)
+        self._resize(state)
+        return name, username, list(state.users)
+
+    def peek(self, name):
+        """Return the resident state for ``name`` without touching or rehydrating it."""
+        return self._rooms.get(name)
+
+    def username(self, channel):
+        info = self._channels.get(channel)
+        return info[1] if info else None
+
+    def set_cursor(self, name, username, pos):
+        """Store the latest cursor for ``username``; returns False if it did not move."""
+        state = self.room(name)
+        previous = state.cursors.get(username)
+        if previous == pos:
+            return False
+        state.cursors[username] = pos
+        state.dirty_cursors.add(username)
+        if previous is None:
+            self._resize(state)
+        return True
+
+    def drop_cursor(self, name, username):
+        """Remove a cursor, marking it dirty so the next frame clears it on clients."""
+        state = self._rooms.get(name)
+        if state is None or state.cursors.pop(username, None) is None:
+            return False
+        state.dirty_cursors.add(username)
+        self._resize(state)
+        return True
+
+    def cached_frame(self, name, digest):
+        """Compressed bytes of the room's last large frame if its text hash matches."""
+        state = self._rooms.get(name)
+        if state is not None and state.frame_digest == digest:
+            return state.frame_data
+        return None
+
+    def cache_frame(self, name, digest, data):
+        """Keep a compressed frame for reuse; it counts against the memory budget."""
+        if len(data) > self.memory_budget // 2:
+            # Caching it would just evict every other room
+            return
+        state = self.room(name)
+        state.frame_digest = digest
+        state.frame_data = data
+        self._resize(state)
+        self._enforce_budget()
+
+    def sweep(self, now=None):
+        """Evict every room idle for longer than ROOM_IDLE_SECONDS."""
+        now = time.monotonic() if now is None else now
+        self._last_sweep = now
+        cutoff = now - self.idle_seconds
+        # LRU order is also last-activity order, so stop at the first active room
+        while self._rooms:
+            name, state = next(iter(self._rooms.items()))
+            if state.last_activity > cutoff:
+                break
+            self._evict(name)
+            self.evicted_idle += 1
+
+    def _enforce_budget(self):
+        # Never evict the most recently used room: it is the one being served
+        while self._bytes > self.memory_budget and len(self._rooms) > 1:
+            name = next(iter(self._rooms))
+            self._evict(name)
+            self.evicted_budget += 1
+
+    def _evict(self, name):
+        state = self._rooms.pop(name)
+        self._bytes -= state.size
+
+    def _resize(self, state):
+        size = state.estimate_size()
+        self._bytes += size - state.size
+        state.size = size
+
+    def stats(self):
+        return {
+            "resident_rooms": len(self._rooms),
+            "connected_channels": len(self._channels),
+            "estimated_bytes": self._bytes,
+            "memory_budget": self.memory_budget,
+            "idle_seconds": self.idle_seconds,
+            "created": self.created,
+            "rehydrated": self.rehydrated,
+            "evicted_idle": self.evicted_idle,
+            "evicted_budget": self.evicted_budget,
+        }
+
+
+# One registry per worker process, shared by all consumers
+ROOMS = RoomRegistry()
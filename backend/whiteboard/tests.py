@@ -1,3 +1,599 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import zlib
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import compression
+from .caching import get_representation, invalidate
+from .db_routing import REPLICA_ALIAS, database_stats
+from .export import BoardImportError, build_object, iter_png
+from .hashing import hashing_stats, run_hashing
+from .middleware import AsyncWhiteNoiseMiddleware
+from .models import Board, BoardObject, Profile
+from .rooms import ROOMS, RoomRegistry
+from .routing import websocket_urlpatterns
+
+
+def stroke(x=0, y=0, **extra):
+    data = {"type": "stroke", "points": [{"x": x, "y": y}, {"x": x + 20, "y": y + 5}],
+            "color": "#00ffff", "lineWidth": 3, "tool": "pen"}
+    data.update(extra)
+    return data
+
+
+def ndjson(*ops):
+    return "\n".join(json.dumps(op) for op in ops)
+
+
+class BoardExportImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="drawer", password="pw")
+        self.board = Board.objects.create(name="export-test")
+        self.client.force_login(self.user)
+
+    def import_body(self, body):
+        return self.client.post(
+            f"/api/board/{self.board.room_code}/import/", data=body, content_type="application/x-ndjson"
+        )
+
+    def export(self, fmt):
+        response = self.client.get(f"/api/board/{self.board.room_code}/export/?format={fmt}")
+        return response, b"".join(response.streaming_content)
+
+    def test_ndjson_round_trip(self):
+        objects = [stroke(i * 10, i * 7) for i in range(5)]
+        response = self.import_body(ndjson({"op": "board", "name": "x"}, *({"op": "add", "object": o} for o in objects)))
+        self.assertEqual(response.json(), {"success": True, "imported": 5})
+
+        response, body = self.export("json")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(lines[0]["op"], "board")
+        self.assertEqual([line["object"] for line in lines[1:]], objects)
+
+        # Re-importing the export (with a leading clear) reproduces the board
+        self.assertEqual(self.import_body(ndjson({"op": "clear"}) + "\n" + body.decode()).json()["imported"], 5)
+        self.assertEqual(BoardObject.objects.filter(board=self.board).count(), 5)
+
+    def test_malformed_lines_are_rejected_atomically(self):
+        bad_lines = [
+            "{not json",
+            json.dumps(["not", "an", "object"]),
+            json.dumps({"op": "explode"}),
+            json.dumps({"op": "add", "object": "nope"}),
+            json.dumps({"op": "add", "object": stroke(points="abc")}),
+            json.dumps({"op": "add", "object": stroke(points=[{"x": 1}])}),
+            json.dumps({"op": "add", "object": stroke(color={"r": 1})}),
+            json.dumps({"op": "add", "object": stroke(lineWidth="wide")}),
+        ]
+        for bad in bad_lines:
+            with self.subTest(line=bad):
+                response = self.import_body(ndjson({"op": "add", "object": stroke()}) + "\n" + bad)
+                self.assertEqual(response.status_code, 400)
+                self.assertTrue(response.json()["error"].startswith("line 2:"))
+                self.assertFalse(BoardObject.objects.filter(board=self.board).exists())
+
+    def test_import_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.import_body(ndjson({"op": "add", "object": stroke()})).status_code, 401)
+
+    def test_build_object_validates(self):
+        with self.assertRaises(BoardImportError):
+            build_object(self.board, stroke(color={"r": 1}))
+        with self.assertRaises(BoardImportError):
+            build_object(self.board, {"points": "abc"})
+        obj = build_object(self.board, stroke(10, 20))
+        self.assertEqual((obj.min_x, obj.min_y, obj.max_x, obj.max_y), (8.5, 18.5, 31.5, 26.5))
+
+    def test_export_formats(self):
+        self.import_body(ndjson(*({"op": "add", "object": stroke(i, i)} for i in range(3)),
+                                {"op": "add", "object": stroke(5, 5, tool="eraser")}))
+
+        response, body = self.export("svg")
+        self.assertEqual(response["Content-Type"], "image/svg+xml")
+        self.assertTrue(body.startswith(b"<?xml"))
+        self.assertEqual(body.count(b"<polyline"), 4)
+        self.assertTrue(body.rstrip().endswith(b"</svg>"))
+
+        response, body = self.export("png")
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertTrue(body.startswith(b"\x89PNG\r\n\x1a\n"))
+        self.assertIn(f'{self.board.room_code}.png', response["Content-Disposition"])
+
+        self.assertEqual(self.client.get(f"/api/board/{self.board.room_code}/export/?format=bmp").status_code, 400)
+        self.assertEqual(self.client.get("/api/board/NOPE0000/export/").status_code, 404)
+
+    def test_export_reads_in_batches_and_releases_the_connection(self):
+        objects = [stroke(i, i) for i in range(5)]
+        self.import_body(ndjson(*({"op": "add", "object": o} for o in objects)))
+        with mock.patch("whiteboard.export.ITER_CHUNK_SIZE", 2), \
+                mock.patch("whiteboard.export._release_connection") as release:
+            response, body = self.export("json")
+        self.assertEqual([json.loads(line)["object"] for line in body.decode().splitlines()[1:]], objects)
+        # Batches of 2, 2 and 1; the connection is given back after each
+        self.assertEqual(release.call_count, 3)
+
+    def test_png_export_skips_unrenderable_rows(self):
+        # Rows stored before validation existed must not abort the stream
+        BoardObject.objects.create(board=self.board, data=stroke(color={"r": 1}), max_x=30, max_y=10)
+        BoardObject.objects.create(board=self.board, data=stroke(color="not-a-colour"), max_x=30, max_y=10)
+        build_object(self.board, stroke()).save()
+        self.assertTrue(b"".join(iter_png(self.board)).startswith(b"\x89PNG"))
+
+
+class CachedRepresentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="viewer", password="pw", email="v@example.com")
+        self.client.force_login(self.user)
+
+    def test_profile_conditional_get(self):
+        first = self.client.get("/api/profile/")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()["email"], "v@example.com")
+
+        response = self.client.get("/api/profile/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get("/api/profile/", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_update_profile_invalidates(self):
+        first = self.client.get("/api/profile/")
+        self.client.post("/api/profile/update/", json.dumps({"phone": "555"}), content_type="application/json")
+
+        response = self.client.get("/api/profile/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["phone"], "555")
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_board_list_conditional_get_and_invalidation(self):
+        first = self.client.get("/api/boards/")
+        self.assertEqual(self.client.get("/api/boards/", HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        Board.objects.create(name="fresh")
+        response = self.client.get("/api/boards/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([b["name"] for b in response.json()["boards"]], ["fresh"])
+
+    def test_rebuild_racing_a_write_is_not_cached(self):
+        # The build reads old data, then the write commits and invalidates
+        # before the build's result is stored
+        def stale_build():
+            invalidate("race")
+            return {"value": "old"}
+
+        self.assertEqual(get_representation("race", stale_build)["body"], b'{"value": "old"}')
+        entry = get_representation("race", lambda: {"value": "new"})
+        self.assertEqual(entry["body"], b'{"value": "new"}')
+
+
+class RoomRegistryTests(TestCase):
+    def setUp(self):
+        self.rooms = RoomRegistry()
+
+    @override_settings(ROOM_IDLE_SECONDS=10)
+    def test_idle_rooms_are_swept(self):
+        stale = self.rooms.room("stale")
+        fresh = self.rooms.room("fresh")
+        stale.last_activity -= 30
+        self.rooms.room("stale")    # touching it again keeps it resident
+        fresh.last_activity -= 30
+        self.rooms.sweep()
+
+        self.assertIsNotNone(self.rooms.peek("stale"))
+        self.assertIsNone(self.rooms.peek("fresh"))
+        self.assertEqual(self.rooms.evicted_idle, 1)
+        self.assertEqual(self.rooms.stats()["estimated_bytes"], self.rooms.peek("stale").size)
+
+    def test_least_recently_used_rooms_are_evicted_over_budget(self):
+        one_room = self.rooms.room("a").size
+        with override_settings(ROOM_STATE_MEMORY_BUDGET=one_room * 2 + 100):
+            self.rooms.room("b")
+            self.rooms.room("a")
+            self.rooms.room("c")
+        self.assertEqual(list(self.rooms._rooms), ["a", "c"])
+        self.assertEqual(self.rooms.evicted_budget, 1)
+
+    def test_cached_frame_counts_against_budget(self):
+        self.rooms.room("a")
+        self.rooms.room("b")
+        before = self.rooms.stats()["estimated_bytes"]
+        with override_settings(ROOM_STATE_MEMORY_BUDGET=before + 2000):
+            self.rooms.cache_frame("a", b"digest", b"x" * 1500)
+            self.assertEqual(self.rooms.cached_frame("a", b"digest"), b"x" * 1500)
+            self.assertIsNone(self.rooms.cached_frame("a", b"other"))
+
+            # A bigger frame for b pushes the total over budget; a goes first
+            self.rooms.cache_frame("b", b"digest", b"y" * 1500)
+        self.assertIsNone(self.rooms.peek("a"))
+        self.assertEqual(self.rooms.cached_frame("b", b"digest"), b"y" * 1500)
+
+    def test_evicted_room_is_rehydrated_from_channels(self):
+        self.rooms.join("room", "chan-1", "alice")
+        self.rooms.join("room", "chan-2", "bob")
+        self.rooms.set_cursor("room", "alice", (1.0, 2.0))
+        self.rooms._evict("room")
+
+        state = self.rooms.room("room")
+        self.assertEqual(state.users, {"alice", "bob"})
+        self.assertEqual(state.cursors, {})
+        self.assertEqual((self.rooms.created, self.rooms.rehydrated), (1, 1))
+        self.assertEqual(self.rooms.leave("chan-1"), ("room", "alice", ["bob"]))
+
+
+@override_settings(CURSOR_FRAME_INTERVAL=0.01)
+class CursorFrameTests(SimpleTestCase):
+    async def connect(self, room, username):
+        socket = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/whiteboard/{room}/")
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        await socket.send_json_to({"type": "join", "username": username})
+        while (await socket.receive_json_from())["type"] != "user_list":
+            pass
+        return socket
+
+    async def next_cursors(self, socket, timeout=1):
+        while True:
+            message = await socket.receive_json_from(timeout)
+            if message["type"] == "cursors":
+                return message["cursors"]
+
+    @override_settings(CURSOR_FRAME_INTERVAL=0.2)
+    async def test_burst_is_coalesced_into_one_full_frame(self):
+        alice, bob = await self.connect("cur1", "alice"), await self.connect("cur1", "bob")
+        await bob.send_json_to({"type": "cursor", "x": 1, "y": 1})
+        for i in range(20):
+            await alice.send_json_to({"type": "cursor", "x": i, "y": i})
+
+        self.assertEqual(await self.next_cursors(bob), {"alice": {"x": 19.0, "y": 19.0}, "bob": {"x": 1.0, "y": 1.0}})
+        # Nothing moved since, so no second frame follows
+        await asyncio.sleep(0.3)
+        while not await bob.receive_nothing(0.05):
+            self.assertNotEqual((await bob.receive_json_from())["type"], "cursors")
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_dropped_frame_is_recovered_by_the_next(self):
+        alice, bob = await self.connect("cur2", "alice"), await self.connect("cur2", "bob")
+        layer = get_channel_layer()
+        group_send = layer.group_send
+        failed = []
+
+        async def lossy_group_send(group, message):
+            if message["type"] == "cursor_frame" and not failed:
+                failed.append(message)
+                raise RuntimeError("channel full")
+            await group_send(group, message)
+
+        with mock.patch.object(layer, "group_send", lossy_group_send), self.assertLogs("whiteboard.cursors", "WARNING"):
+            await alice.send_json_to({"type": "cursor", "x": 5, "y": 6})
+            # No further movement: the next tick resends the full map
+            self.assertEqual(await self.next_cursors(bob), {"alice": {"x": 5.0, "y": 6.0}})
+        self.assertEqual(len(failed), 1)
+        await alice.disconnect()
+        await bob.disconnect()
+
+    @override_settings(CURSOR_MAX_AGE=0)
+    async def test_stale_frame_is_resent_when_nothing_newer_arrives(self):
+        alice, bob = await self.connect("cur3", "alice"), await self.connect("cur3", "bob")
+        await alice.send_json_to({"type": "cursor", "x": 7, "y": 8})
+        self.assertEqual(await self.next_cursors(bob), {"alice": {"x": 7.0, "y": 8.0}})
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_non_finite_positions_are_ignored(self):
+        alice, bob = await self.connect("cur6", "alice"), await self.connect("cur6", "bob")
+        for x, y in (("nan", 1), (1, "inf"), ("-inf", "-inf"), (1e400, 0)):
+            await alice.send_json_to({"type": "cursor", "x": x, "y": y})
+        await bob.send_json_to({"type": "cursor", "x": 1, "y": 2})
+
+        message = await bob.receive_output()
+        while "cursors" not in message["text"]:
+            message = await bob.receive_output()
+        # Strict parse: NaN/Infinity would be rejected by the browser
+        cursors = json.loads(message["text"], parse_constant=lambda c: self.fail(f"{c} in frame"))["cursors"]
+        self.assertEqual(cursors, {"bob": {"x": 1.0, "y": 2.0}})
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_disconnect_removes_cursor(self):
+        alice, bob = await self.connect("cur4", "alice"), await self.connect("cur4", "bob")
+        await alice.send_json_to({"type": "cursor", "x": 3, "y": 4})
+        self.assertEqual(await self.next_cursors(bob), {"alice": {"x": 3.0, "y": 4.0}})
+
+        await alice.disconnect()
+        self.assertEqual(await self.next_cursors(bob), {})
+        self.assertEqual(ROOMS.peek("room_cur4").cursors, {})
+        await bob.disconnect()
+
+    async def test_frames_from_another_worker_are_merged_and_ordered(self):
+        bob = await self.connect("cur5", "bob")
+        layer = get_channel_layer()
+        frame = {"type": "cursor_frame", "origin": "other-worker", "sent_at": 0}
+        await layer.group_send("room_cur5", dict(frame, seq=2, cursors={"carol": {"x": 1, "y": 1}}))
+        # Other workers' clocks are never compared, so sent_at=0 is not stale
+        self.assertEqual(await self.next_cursors(bob), {"carol": {"x": 1, "y": 1}})
+
+        await layer.group_send("room_cur5", dict(frame, seq=1, cursors={}))
+        self.assertTrue(await bob.receive_nothing(0.05))
+        await bob.disconnect()
+
+
+class AsyncAuthViewTests(TransactionTestCase):
+    # Hashing (and authenticate's queries) run on the dedicated pool's threads,
+    # which cannot see rows inside a TestCase transaction
+    async def register(self, **data):
+        return await self.async_client.post("/api/register/", json.dumps(data), content_type="application/json")
+
+    async def test_register_and_login(self):
+        response = await self.register(username="newbie", password="s3cret-pass")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(await User.objects.filter(username="newbie").aexists())
+
+        response = await self.async_client.post(
+            "/api/login/", json.dumps({"username": "newbie", "password": "s3cret-pass"}), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_register_rejects_missing_fields(self):
+        for data in ({}, {"username": "a"}, {"password": "pw"}, {"username": "", "password": "pw"}):
+            with self.subTest(data=data):
+                response = await self.register(**data)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()["success"])
+
+    async def test_register_duplicate_username(self):
+        await User.objects.acreate(username="taken")
+        response = await self.register(username="taken", password="pw")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Username already exists")
+        self.assertEqual(await User.objects.filter(username="taken").acount(), 1)
+
+    @override_settings(PASSWORD_HASH_QUEUE=0)
+    async def test_full_hashing_pool_answers_503(self):
+        release = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Occupy every worker of the real pool; with no queue the next call is refused
+        busy = [
+            asyncio.ensure_future(run_hashing(lambda: asyncio.run_coroutine_threadsafe(release.wait(), loop).result()))
+            for _ in range(hashing_stats()["workers"])
+        ]
+        await asyncio.sleep(0)
+        try:
+            for path, data in (("/api/login/", {"username": "u", "password": "p"}),
+                               ("/api/register/", {"username": "u", "password": "p"})):
+                with self.subTest(path=path):
+                    response = await self.async_client.post(path, json.dumps(data), content_type="application/json")
+                    self.assertEqual(response.status_code, 503)
+                    self.assertEqual(response["Retry-After"], "1")
+        finally:
+            release.set()
+            await asyncio.gather(*busy)
+        self.assertFalse(await User.objects.filter(username="u").aexists())
+
+
+    async def test_stats_report_the_pool_size_in_use(self):
+        await run_hashing(lambda: None)
+        workers = hashing_stats()["workers"]
+        with override_settings(PASSWORD_HASH_WORKERS=workers + 5):
+            # The executor keeps the size it was created with
+            self.assertEqual(hashing_stats()["workers"], workers)
+
+
+class StaticFilesTests(SimpleTestCase):
+    path = "/static/admin/css/base.css"
+
+    def test_served_in_sync_mode(self):
+        for autorefresh in (True, False):
+            with self.subTest(autorefresh=autorefresh), override_settings(WHITENOISE_AUTOREFRESH=autorefresh):
+                response = Client().get(self.path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], "text/css; charset=\"utf-8\"")
+                response.close()
+
+    async def test_served_in_async_mode(self):
+        async def view(request):
+            return HttpResponse("view")
+
+        middleware = AsyncWhiteNoiseMiddleware(view)
+        # Async all the way down: no sync_to_async hop for non-static requests
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual((await middleware(RequestFactory().get("/api/test/"))).content, b"view")
+        response = await middleware(RequestFactory().get(self.path))
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+        for autorefresh in (True, False):
+            with self.subTest(autorefresh=autorefresh), override_settings(WHITENOISE_AUTOREFRESH=autorefresh):
+                response = await AsyncClient().get(self.path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], "text/css; charset=\"utf-8\"")
+                response.close()
+
+
+class ReadReplicaRoutingTests(TestCase):
+    """A second, independent SQLite database stands in for the replica, so
+    which alias served a read shows up in the response."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Registered only for this class, so other tests keep a primary-only
+        # setup; the alias does not exist yet when the runner reads
+        # ``databases``, so it is allowed (and rolled back per test) from here
+        connections.settings[REPLICA_ALIAS] = dict(
+            connections.settings["default"], NAME="file:memorydb_replica?mode=memory&cache=shared"
+        )
+        cls.databases = cls.databases | {REPLICA_ALIAS}
+        call_command("migrate", database=REPLICA_ALIAS, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA_ALIAS].close()
+        del connections[REPLICA_ALIAS]
+        del connections.settings[REPLICA_ALIAS]
+        cls.databases = cls.databases - {REPLICA_ALIAS}
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="reader", password="pw", email="r@example.com")
+        self.client.force_login(self.user)
+
+    def board_names(self):
+        return [b["name"] for b in self.client.get("/api/boards/").json()["boards"]]
+
+    def seed_replica(self, name):
+        Board.objects.using(REPLICA_ALIAS).create(name=name)
+        # Saving it pinned the board list to the primary; start unpinned
+        cache.clear()
+
+    def test_board_list_reads_from_replica(self):
+        self.seed_replica("on-replica")
+        with CaptureQueriesContext(connections["default"]) as primary:
+            self.assertEqual(self.board_names(), ["on-replica"])
+        self.assertFalse([q for q in primary.captured_queries if "whiteboard_board" in q["sql"]])
+
+    def test_rebuild_after_invalidate_reads_from_primary(self):
+        self.seed_replica("on-replica")
+        self.assertEqual(self.board_names(), ["on-replica"])
+
+        # The write lands on the primary; the replica has not caught up
+        Board.objects.create(name="on-primary")
+        self.assertEqual(self.board_names(), ["on-primary"])
+
+        # Once the pin expires reads go back to the replica
+        cache.clear()
+        self.assertEqual(self.board_names(), ["on-replica"])
+
+    def test_routing_stats_only_count_routed_reads(self):
+        self.seed_replica("on-replica")
+        before = database_stats()["routing"]
+        list(Board.objects.all())                 # outside a routed view
+        self.client.get("/api/boards/")           # one routed read, from the replica
+        Board.objects.create(name="on-primary")
+        self.client.get("/api/boards/")           # pinned rebuild, from the primary
+        after = database_stats()["routing"]
+        self.assertEqual(after["replica_reads"] - before["replica_reads"], 1)
+        self.assertEqual(after["primary_reads"] - before["primary_reads"], 1)
+
+    def test_writes_and_profile_creation_use_primary(self):
+        Profile.objects.filter(user=self.user).delete()
+        cache.clear()
+        with CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            self.assertEqual(self.client.get("/api/profile/").json()["email"], "r@example.com")
+            self.client.post("/api/profile/update/", json.dumps({"phone": "555"}), content_type="application/json")
+
+        replica_sql = [q["sql"] for q in replica.captured_queries]
+        self.assertTrue(any("whiteboard_profile" in sql for sql in replica_sql))
+        self.assertFalse([sql for sql in replica_sql if not sql.startswith("SELECT")])
+        self.assertEqual(Profile.objects.get(user=self.user).phone, "555")
+        self.assertFalse(Profile.objects.using(REPLICA_ALIAS).exists())
+
+
+@override_settings(WS_COMPRESSION_THRESHOLD=200)
+class FrameCompressionTests(SimpleTestCase):
+    async def connect(self, room, compress):
+        path = f"/ws/ide/{room}/" + ("?compress=deflate" if compress else "")
+        socket = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        return socket
+
+    async def broadcast(self, sender, code):
+        await sender.send_json_to({"type": "code_update", "code": code, "file": "main.py"})
+
+    def expected(self, code):
+        return {"type": "code_update", "code": code, "file": "main.py"}
+
+    async def test_threshold_and_opt_in(self):
+        deflate, plain = await self.connect("cmp1", True), await self.connect("cmp1", False)
+        small, large = "x = 1", "print('hello')\n" * 40
+
+        await self.broadcast(plain, small)
+        self.assertEqual(json.loads((await deflate.receive_output())["text"]), self.expected(small))
+        self.assertEqual(await plain.receive_json_from(), self.expected(small))
+
+        await self.broadcast(plain, large)
+        message = await deflate.receive_output()
+        self.assertNotIn("text", message)
+        self.assertEqual(json.loads(zlib.decompress(message["bytes"])), self.expected(large))
+        self.assertLess(len(message["bytes"]), len(large))
+        # Sockets that did not opt in always get text
+        self.assertEqual(await plain.receive_json_from(), self.expected(large))
+        await deflate.disconnect()
+        await plain.disconnect()
+
+    async def test_threshold_counts_bytes(self):
+        # 80 characters but 240 bytes of UTF-8: over the 200 byte threshold
+        text = json.dumps({"code": "\u20ac" * 80}, ensure_ascii=False)
+        self.assertLess(len(text), 200)
+        self.assertEqual(await compression.encode_frame("room_cmp2", text, False), (text, None))
+        _, data = await compression.encode_frame("room_cmp2", text, True)
+        self.assertEqual(zlib.decompress(data).decode(), text)
+
+    async def test_room_reuses_compressed_frame_and_reports_stats(self):
+        sockets = [await self.connect("cmp3", True) for _ in range(3)]
+        before = compression.compression_stats()
+        code = "def f():\n    return 42\n" * 30
+        await self.broadcast(sockets[0], code)
+        frames = [(await s.receive_output())["bytes"] for s in sockets]
+
+        self.assertEqual(len(set(frames)), 1)
+        stats = compression.compression_stats()
+        self.assertEqual(stats["frames_compressed"] - before["frames_compressed"], 3)
+        self.assertEqual(stats["cache_hits"] - before["cache_hits"], 2)
+        self.assertGreater(stats["compress_seconds"], before["compress_seconds"])
+        self.assertLess(stats["ratio"], 1)
+        self.assertGreater(stats["avg_compress_ms"], 0)
+        for s in sockets:
+            await s.disconnect()
+
+    @override_settings(WS_COMPRESSION_OFFLOAD_BYTES=500)
+    async def test_large_frames_are_compressed_off_the_event_loop(self):
+        sockets = [await self.connect("cmp4", True) for _ in range(3)]
+        threads = []
+        deflate = compression._deflate
+
+        def recording_deflate(raw):
+            threads.append(threading.current_thread())
+            return deflate(raw)
+
+        with mock.patch.object(compression, "_deflate", recording_deflate):
+            await self.broadcast(sockets[0], "y = 2\n" * 40)        # under the offload size
+            frames = [(await s.receive_output())["bytes"] for s in sockets]
+            await self.broadcast(sockets[0], "z = 3\n" * 200)       # over it
+            frames += [(await s.receive_output())["bytes"] for s in sockets]
+
+        self.assertEqual(json.loads(zlib.decompress(frames[-1]))["code"], "z = 3\n" * 200)
+        # One compression per frame, the room's other sockets reuse it
+        self.assertEqual(len(threads), 2)
+        self.assertIs(threads[0], threading.current_thread())
+        self.assertIsNot(threads[1], threading.current_thread())
+        for s in sockets:
+            await s.disconnect()
+
+
+class RealtimeMetricsTests(TestCase):
+    def test_staff_only(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.client.force_login(User.objects.create_user(username="member", password="pw"))
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+
+        self.client.force_login(User.objects.create_user(username="ops", password="pw", is_staff=True))
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {"compression", "rooms", "cursors", "auth", "database"})
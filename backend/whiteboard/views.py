@@ -1,41 +1,80 @@
-from django.contrib.auth import authenticate, login, logout
+from asgiref.sync import sync_to_async
+from django.contrib.auth import alogin, authenticate, logout
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from django.http import JsonResponse, HttpResponseRedirect
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models.signals import post_save  # Add this import
+from django.db.models.signals import post_save, post_delete  # Add this import
 from django.dispatch import receiver             # Add this import
 from .models import Profile, Board
+from .caching import (
+    ACTIVE_BOARDS_KEY, board_key, conditional_json_response, get_representation,
+    invalidate, profile_key,
+)
+from .compression import compression_stats
+from .db_routing import database_stats, read_replica
+from .cursors import cursor_stats
+from .rooms import ROOMS
+from .hashing import HashingOverloaded, hashing_stats, run_hashing
+from .export import EXPORT_FORMATS, BoardImportError, import_ops, streaming_response
 import json
 import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _overloaded():
+    response = JsonResponse({"success": False, "error": "Server busy, please retry"}, status=503)
+    response["Retry-After"] = "1"
+    return response
+
 @csrf_exempt
-def api_login(request):
+async def api_login(request):
     if request.method == "POST":
         data = json.loads(request.body)
         username = data.get("username")
         password = data.get("password")
-        user = authenticate(request, username=username, password=password)
+        # authenticate hashes the password (and may upgrade the stored hash), so
+        # it runs on the bounded hashing pool rather than the ASGI thread pool
+        try:
+            user = await run_hashing(authenticate, request, username=username, password=password)
+        except HashingOverloaded:
+            return _overloaded()
         if user is not None:
-            login(request, user)
+            await alogin(request, user)
             return JsonResponse({"success": True})
         else:
             return JsonResponse({"success": False, "error": "Invalid credentials"}, status=400)
     return JsonResponse({"error": "POST required"}, status=405)
 
+def _insert_user(username, email, password_hash):
+    # Uniqueness is enforced by the insert itself instead of a separate exists() query
+    user = User(username=User.normalize_username(username), email=User.objects.normalize_email(email or ""))
+    user.password = password_hash
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        return None
+    return user
+
 @csrf_exempt
-def api_register(request):
+async def api_register(request):
     if request.method == "POST":
         data = json.loads(request.body)
         username = data.get("username")
         password = data.get("password")
         email = data.get("email")
-        if User.objects.filter(username=username).exists():
+        if not username or not password:
+            return JsonResponse({"success": False, "error": "Username and password are required"}, status=400)
+        try:
+            password_hash = await run_hashing(make_password, password)
+        except HashingOverloaded:
+            return _overloaded()
+        user = await sync_to_async(_insert_user)(username, email, password_hash)
+        if user is None:
             return JsonResponse({"success": False, "error": "Username already exists"}, status=400)
-        user = User.objects.create_user(username=username, password=password, email=email)
-        user.save()
         return JsonResponse({"success": True})
     return JsonResponse({"error": "POST required"}, status=405)
 
@@ -52,22 +91,37 @@ def google_login(request):
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
     Profile.objects.get_or_create(user=instance)
+    invalidate(profile_key(instance.pk))
+
+@receiver(post_save, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate(profile_key(instance.user_id))
+
+@receiver(post_save, sender=Board)
+@receiver(post_delete, sender=Board)
+def invalidate_cached_boards(sender, instance, **kwargs):
+    invalidate(ACTIVE_BOARDS_KEY, board_key(instance.room_code))
+
+def _build_profile(user):
+    # One query on a cache miss: the profile and its user in a single join
+    profile = Profile.objects.select_related("user").filter(user=user).first()
+    if profile is None:
+        # get_or_create reads from the primary, so a lagging replica cannot cause a duplicate
+        profile, _ = Profile.objects.get_or_create(user=user)
+    return {
+        "username": profile.user.username,
+        "email": profile.user.email,
+        "dob": profile.dob,
+        "phone": profile.phone,
+        "profile_pic": profile.profile_pic.url if profile.profile_pic else "",
+    }
 
 @csrf_exempt
+@read_replica
 def get_profile(request):
-    if request.method == "GET" and request.user.is_authenticated:
-        try:
-            profile = request.user.profile
-        except Profile.DoesNotExist:
-            profile = Profile.objects.create(user=request.user)
-        data = {
-            "username": request.user.username,
-            "email": request.user.email,
-            "dob": profile.dob,
-            "phone": profile.phone,
-            "profile_pic": profile.profile_pic.url if profile.profile_pic else "",
-        }
-        return JsonResponse(data)
+    if request.method in ("GET", "HEAD") and request.user.is_authenticated:
+        entry = get_representation(profile_key(request.user.pk), lambda: _build_profile(request.user))
+        return conditional_json_response(request, entry, private=True)
     return JsonResponse({"error": "Unauthorized"}, status=401)
 
 @csrf_exempt
@@ -117,44 +171,107 @@ def create_board(request):
     print("Invalid method")
     return JsonResponse({"error": "POST required"}, status=405)
 
+def _build_join(room_code):
+    board = Board.objects.filter(room_code=room_code, is_active=True).first()
+    if board is None:
+        return None
+    return {
+        "success": True,
+        "board_id": board.id,
+        "room_code": board.room_code,
+        "room_name": board.name
+    }
+
 @csrf_exempt
+@read_replica
 def join_board(request):
-    if request.method == "POST":
+    # GET ?room_code= is the cacheable form; POST with a JSON body is kept for existing clients
+    if request.method in ("GET", "HEAD", "POST"):
         try:
-            data = json.loads(request.body)
+            if request.method == "POST":
+                data = json.loads(request.body)
+            else:
+                data = request.GET
             room_code = data.get("room_code", "").upper().strip()
             
             if not room_code:
                 return JsonResponse({"error": "Room code is required"}, status=400)
             
             # Find board by room code
-            try:
-                board = Board.objects.get(room_code=room_code, is_active=True)
-                return JsonResponse({
-                    "success": True,
-                    "board_id": board.id,
-                    "room_code": board.room_code,
-                    "room_name": board.name
-                })
-            except Board.DoesNotExist:
+            entry = get_representation(board_key(room_code), lambda: _build_join(room_code))
+            if entry is None:
                 return JsonResponse({"error": "Invalid room code"}, status=404)
+            return conditional_json_response(request, entry)
                 
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"error": "POST required"}, status=405)
 
+def _build_active_boards():
+    boards = Board.objects.filter(is_active=True).order_by('-created_at')[:20]
+    return {"boards": [{
+        "id": board.id,
+        "name": board.name,
+        "room_code": board.room_code,
+        "created_at": board.created_at.isoformat()
+    } for board in boards]}
+
 @csrf_exempt
+@read_replica
 def get_active_boards(request):
+    if request.method in ("GET", "HEAD"):
+        entry = get_representation(ACTIVE_BOARDS_KEY, _build_active_boards)
+        return conditional_json_response(request, entry)
+    return JsonResponse({"error": "GET required"}, status=405)
+
+@csrf_exempt
+def export_board(request, room_code):
+    if request.method == "GET":
+        fmt = request.GET.get("format", "json").lower()
+        if fmt not in EXPORT_FORMATS:
+            return JsonResponse({"error": "format must be one of: " + ", ".join(EXPORT_FORMATS)}, status=400)
+        try:
+            board = Board.objects.get(room_code=room_code.upper(), is_active=True)
+        except Board.DoesNotExist:
+            return JsonResponse({"error": "Invalid room code"}, status=404)
+
+        generator, content_type, extension = EXPORT_FORMATS[fmt]
+        response = streaming_response(request, generator(board), content_type)
+        response["Content-Disposition"] = f'attachment; filename="{board.room_code}.{extension}"'
+        return response
+    return JsonResponse({"error": "GET required"}, status=405)
+
+@csrf_exempt
+def import_board(request, room_code):
+    if request.method == "POST":
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Unauthorized"}, status=401)
+        try:
+            board = Board.objects.get(room_code=room_code.upper(), is_active=True)
+        except Board.DoesNotExist:
+            return JsonResponse({"error": "Invalid room code"}, status=404)
+
+        # Iterate the request stream line by line instead of loading request.body
+        try:
+            imported = import_ops(board, (line.decode("utf-8") for line in request))
+        except (BoardImportError, UnicodeDecodeError) as e:
+            return JsonResponse({"success": False, "error": str(e)}, status=400)
+        logger.info("import_board: room=%s imported=%s", board.room_code, imported)
+        return JsonResponse({"success": True, "imported": imported})
+    return JsonResponse({"error": "POST required"}, status=405)
+
+def realtime_metrics(request):
+    # Worker internals (pool state, queue depths, room counts): staff only
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Forbidden"}, status=403)
     if request.method == "GET":
-        boards = Board.objects.filter(is_active=True).order_by('-created_at')[:20]
-        boards_data = [{
-            "id": board.id,
-            "name": board.name,
-            "room_code": board.room_code,
-            "created_at": board.created_at.isoformat()
-        } for board in boards]
-        
-        return JsonResponse({"boards": boards_data})
+        return JsonResponse({
+            "compression": compression_stats(),
+            "rooms": ROOMS.stats(),
+            "cursors": cursor_stats(),
+            "auth": hashing_stats(),
+            "database": database_stats(),
+        })
     return JsonResponse({"error": "GET required"}, status=405)
 
 @csrf_exempt
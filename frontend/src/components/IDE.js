@@ -4,6 +4,7 @@ import QuickChat from './QuickChat';
 import ChatButton from './ChatButton';
 import '../styles/IDE.css';
 import { WS_BASE_URL } from '../config';
+import { withCompression, createFrameHandler } from '../wsFrames';
 
 function IDE({ ideId: propIdeId }) {
   const { ideId: urlIdeId } = useParams();
@@ -31,7 +32,8 @@ function IDE({ ideId: propIdeId }) {
     if (!ideId) return;
 
     const clientId = `ide_${Math.floor(Math.random()*1e9)}`;
-    const ws = new WebSocket(`${WS_BASE_URL}/ws/ide/${ideId}/`);
+    const ws = new WebSocket(withCompression(`${WS_BASE_URL}/ws/ide/${ideId}/`));
+    ws.binaryType = 'arraybuffer';
     let joined = false;
 
     ws.onopen = () => {
@@ -41,8 +43,7 @@ function IDE({ ideId: propIdeId }) {
       // before the user provides their chosen username). The joinIDE() function will send the proper join.
     };
 
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
+    ws.onmessage = createFrameHandler((data) => {
       console.log('Received:', data);
 
       switch (data.type) {
@@ -65,7 +66,7 @@ function IDE({ ideId: propIdeId }) {
         default:
           break;
       }
-    };
+    });
 
     ws.onclose = () => {
       console.log('IDE WebSocket connection closed');
@@ -1,5 +1,6 @@
 import React, { useRef, useEffect, useState, useCallback, useMemo } from 'react';
 import { WS_BASE_URL } from '../config';
+import { withCompression, createFrameHandler } from '../wsFrames';
 import '../styles/Whiteboard.css';
 import QuickChat from './QuickChat';
 
@@ -16,6 +17,7 @@ const Whiteboard = ({ roomName = 'default-room' }) => {
   
   const [username] = useState(`User_${Math.floor(Math.random() * 1000)}`);
   const [isQuickChatOpen, setIsQuickChatOpen] = useState(false);
+  const [remoteCursors, setRemoteCursors] = useState({});
 
   // Tools and colors
   const tools = useMemo(() => [
@@ -123,7 +125,8 @@ const Whiteboard = ({ roomName = 'default-room' }) => {
 
     let ws;
     try {
-      ws = new WebSocket(`${WS_BASE_URL}/ws/whiteboard/${roomName}/`);
+      ws = new WebSocket(withCompression(`${WS_BASE_URL}/ws/whiteboard/${roomName}/`));
+      ws.binaryType = 'arraybuffer';
     } catch (err) {
       console.error('Failed to create WebSocket:', err);
       return;
@@ -145,9 +148,8 @@ const Whiteboard = ({ roomName = 'default-room' }) => {
       }
     };
 
-    ws.onmessage = (event) => {
+    ws.onmessage = createFrameHandler((data) => {
       try {
-        const data = JSON.parse(event.data);
         if (data.type === 'user_list') {
           setUsers(data.users);
         } else {
@@ -162,6 +164,12 @@ const Whiteboard = ({ roomName = 'default-room' }) => {
               setDrawingObjects([]);
               clearCanvas();
               break;
+            case 'cursors':
+              // Every frame is the room's full cursor map: replace, don't merge
+              setRemoteCursors(Object.fromEntries(
+                Object.entries(data.cursors || {}).filter(([name]) => name !== username)
+              ));
+              break;
             case 'chat':
               // optional: handle chat in whiteboard UI
               break;
@@ -170,9 +178,9 @@ const Whiteboard = ({ roomName = 'default-room' }) => {
           }
         }
       } catch (err) {
-        console.error('WS message parse error', err, event.data);
+        console.error('WS message handling error', err, data);
       }
-    };
+    });
 
     ws.onclose = (ev) => {
       console.log('Disconnected from whiteboard', ev, 'code=', ev.code, 'reason=', ev.reason);
@@ -296,6 +304,36 @@ const Whiteboard = ({ roomName = 'default-room' }) => {
     }
   }, [isDrawing, currentTool]);
 
+  // Cursor presence: the server only keeps the latest position, so send at
+  // most one update per interval plus a trailing one for the final position
+  const cursorTimerRef = useRef(null);
+  const pendingCursorRef = useRef(null);
+  const lastCursorSentRef = useRef(0);
+  const CURSOR_SEND_INTERVAL = 50;
+
+  const flushCursor = useCallback(() => {
+    cursorTimerRef.current = null;
+    const pos = pendingCursorRef.current;
+    pendingCursorRef.current = null;
+    if (!pos || wsRef.current?.readyState !== WebSocket.OPEN) return;
+    lastCursorSentRef.current = Date.now();
+    wsRef.current.send(JSON.stringify({ type: 'cursor', x: Math.round(pos.x), y: Math.round(pos.y) }));
+  }, []);
+
+  const sendCursor = useCallback((e) => {
+    pendingCursorRef.current = getPointerPos(e);
+    if (cursorTimerRef.current) return;
+    const wait = Math.max(0, CURSOR_SEND_INTERVAL - (Date.now() - lastCursorSentRef.current));
+    cursorTimerRef.current = setTimeout(flushCursor, wait);
+  }, [getPointerPos, flushCursor]);
+
+  useEffect(() => () => clearTimeout(cursorTimerRef.current), []);
+
+  const handlePointerMove = useCallback((e) => {
+    sendCursor(e);
+    draw(e);
+  }, [sendCursor, draw]);
+
   const clearAll = useCallback(() => {
     setDrawingObjects([]);
     clearCanvas();
@@ -388,13 +426,18 @@ const Whiteboard = ({ roomName = 'default-room' }) => {
           ref={canvasRef}
           className="whiteboard-canvas"
           onMouseDown={startDrawing}
-          onMouseMove={draw}
+          onMouseMove={handlePointerMove}
           onMouseUp={stopDrawing}
           onMouseLeave={stopDrawing}
           onTouchStart={startDrawing}
-          onTouchMove={draw}
+          onTouchMove={handlePointerMove}
           onTouchEnd={stopDrawing}
         />
+        {Object.entries(remoteCursors).map(([name, pos]) => (
+          <div key={name} className="remote-cursor" style={{ left: pos.x, top: pos.y }}>
+            <span className="remote-cursor-label">{name}</span>
+          </div>
+        ))}
       </div>
 
       <QuickChat
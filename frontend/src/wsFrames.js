@@ -0,0 +1,26 @@
+// Helpers for realtime sockets that negotiate compressed frames.
+// Large frames arrive as binary zlib data; small ones stay as JSON text.
+
+export const COMPRESSION_SUPPORTED = typeof DecompressionStream !== 'undefined';
+
+// Append the compression opt-in to a socket URL when the browser can inflate
+export const withCompression = (url) =>
+  COMPRESSION_SUPPORTED ? `${url}${url.includes('?') ? '&' : '?'}compress=deflate` : url;
+
+const inflate = async (buffer) => {
+  const stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return new Response(stream).text();
+};
+
+// Build an onmessage handler that decodes frames and calls handle(data) in
+// arrival order, even when a compressed frame takes longer to inflate.
+export const createFrameHandler = (handle) => {
+  let chain = Promise.resolve();
+  return (event) => {
+    const raw = event.data;
+    chain = chain
+      .then(() => (typeof raw === 'string' ? raw : inflate(raw)))
+      .then((text) => handle(JSON.parse(text)))
+      .catch((err) => console.error('WS frame decode error', err));
+  };
+};